@@ -1,7 +1,10 @@
 import os
 import csv
+import json
 import time
+import queue
 import random
+import shlex
 import threading
 import subprocess
 import logging
@@ -10,45 +13,156 @@ import tkinter as tk
 from tkinter import messagebox, ttk
 from typing import Dict, List, Optional, Tuple
 
+import mss
 import pyautogui
 import pygetwindow as gw
 from PIL import Image
 
 import torch
 import numpy as np
+from torchvision import transforms
 from transformers import CLIPProcessor, CLIPModel
 
+# ONNX Runtime is optional; when installed it replaces the PyTorch vision path for inference
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
 # === CONFIGURATION === #
 # File to store counts of detected labels
-LABEL_COUNT_FILE: str = "label_counts.csv"
+LABEL_COUNT_FILE: str = "label_counts.json"
+# Legacy CSV label counts, imported once into LABEL_COUNT_FILE if it does not exist yet
+LEGACY_LABEL_COUNT_FILE: str = "label_counts.csv"
+# Maximum number of session loop iterations between writes of changed label counts
+LABEL_SAVE_INTERVAL: int = 30
 # Title of the Scrcpy mirror window
 SCRCPY_WINDOW_TITLE: str = "Scrcpy_Mirror_Window"
+# Save each captured screenshot to disk for debugging (disabled by default to avoid per-frame PNG I/O)
+DEBUG_SAVE_SCREENSHOTS: bool = False
+DEBUG_SCREENSHOT_PATH: str = "scrcpy_window_screenshot.png"
+# Apply dynamic int8 quantization to the CLIP vision tower's Linear layers for faster CPU inference
+QUANTIZE_VISION_MODEL: bool = True
+# Exported CLIP image encoder used with ONNX Runtime (created on first run if onnxruntime is installed)
+ONNX_VISION_MODEL_PATH: str = "clip_vision.onnx"
+# Shortest edge screenshots are cheaply downscaled to before CLIP's bicubic resize to 224
+PRESCALE_SHORTEST_EDGE: int = 256
+# Seconds to let the feed finish its scroll animation (and Scrcpy mirror it) before capturing the next frame
+SCROLL_SETTLE_SECONDS: float = 1.0
 
 # === INITIALIZE LOGGING === #
 # Configure basic logging for informational messages
 logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(message)s")
 
 # === GLOBAL VARIABLES FOR GUI AND THREAD CONTROL === #
-# Event flag to control the execution of long-running threads (scheduler, ADB keep-alive)
+# Event flag to control the execution of long-running threads (scheduler, sessions)
 running_event: threading.Event = threading.Event()
 # Reference to the main scheduling thread
 scheduler_thread: Optional[threading.Thread] = None
 # Reference to the Scrcpy subprocess
 adb_process: Optional[subprocess.Popen] = None
+# Persistent `adb shell` session reused for device input commands, guarded by a lock across threads
+adb_shell_process: Optional[subprocess.Popen] = None
+adb_shell_lock: threading.Lock = threading.Lock()
+# Lines read from the persistent shell's stdout by its reader thread (None marks end of output)
+adb_shell_output: "Optional[queue.Queue[Optional[str]]]" = None
+# Marker echoed after each shell command to delimit its output
+ADB_SHELL_SENTINEL: str = "__ADB_CMD_END__"
+# Maximum seconds to wait for a persistent shell command to finish before restarting the shell
+ADB_SHELL_TIMEOUT: float = 10.0
 
 # === LOAD AI MODEL === #
 logging.info("Loading CLIP model for image classification...")
 # Load pre-trained CLIP model and processor
 model = CLIPModel.from_pretrained("openai/clip-vit-base-patch16")
 processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch16")
+# Inference only: disable dropout/training behaviour and gradient tracking
+model.eval()
+model.requires_grad_(False)
+# Run CLIP on the GPU when available, using FP16 autocast there to make use of tensor cores
+DEVICE: str = "cuda" if torch.cuda.is_available() else "cpu"
+USE_FP16: bool = DEVICE == "cuda"
+model.to(DEVICE)
+logging.info(f"CLIP model running on {DEVICE}.")
+
+# Build CLIP's resize/crop once instead of dispatching through the processor per frame
+image_resize_crop = transforms.Compose([
+    transforms.Resize(224, interpolation=transforms.InterpolationMode.BICUBIC),
+    transforms.CenterCrop(224),
+])
+PIXEL_MEAN: torch.Tensor = torch.tensor(processor.image_processor.image_mean).view(3, 1, 1)
+PIXEL_STD: torch.Tensor = torch.tensor(processor.image_processor.image_std).view(3, 1, 1)
+# Reusable preprocessing buffers to avoid allocating new arrays/tensors for every screenshot;
+# the float buffer is pinned on CUDA so the host-to-device copy can be asynchronous
+PIXEL_BYTES: np.ndarray = np.empty((224, 224, 3), dtype=np.uint8)
+PIXEL_BUFFER: torch.Tensor = torch.empty((1, 3, 224, 224), dtype=torch.float32, pin_memory=DEVICE == "cuda")
+
+class CLIPImageEncoder(torch.nn.Module):
+    """Wraps CLIP's vision tower and projection so they export as a single ONNX graph."""
+
+    def __init__(self, clip_model: CLIPModel) -> None:
+        super().__init__()
+        self.clip_model = clip_model
+
+    def forward(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        return self.clip_model.get_image_features(pixel_values=pixel_values)
+
+def load_onnx_vision_session() -> Optional["ort.InferenceSession"]:
+    """
+    Loads the CLIP image encoder into an ONNX Runtime CPU session, exporting it first if needed.
+
+    Returns:
+        An onnxruntime.InferenceSession, or None if onnxruntime is unavailable or loading fails.
+    """
+    if ort is None:
+        return None
+    try:
+        if not os.path.exists(ONNX_VISION_MODEL_PATH):
+            logging.info(f"Exporting CLIP image encoder to {ONNX_VISION_MODEL_PATH}...")
+            with torch.no_grad():
+                torch.onnx.export(CLIPImageEncoder(model), (torch.zeros((1, 3, 224, 224)),), ONNX_VISION_MODEL_PATH,
+                                  input_names=["pixel_values"], output_names=["image_embeds"], opset_version=17)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = os.cpu_count() or 1
+        session = ort.InferenceSession(ONNX_VISION_MODEL_PATH, sess_options=options, providers=["CPUExecutionProvider"])
+        logging.info("CLIP image encoder loaded with ONNX Runtime.")
+        return session
+    except Exception as e:
+        logging.warning(f"ONNX Runtime setup failed, using PyTorch CLIP vision model: {e}")
+        return None
+
+# On CPU prefer ONNX Runtime for the per-screenshot vision forward; otherwise optimize the PyTorch model
+vision_session = load_onnx_vision_session() if DEVICE == "cpu" else None
+if vision_session is None:
+    # Quantize the vision tower's Linear layers to int8 (CPU only); text embeddings are cached in full precision
+    if QUANTIZE_VISION_MODEL and DEVICE == "cpu":
+        try:
+            model.vision_model = torch.quantization.quantize_dynamic(model.vision_model, {torch.nn.Linear}, dtype=torch.qint8)
+            logging.info("CLIP vision model quantized to int8.")
+        except Exception as e:  # No quantization engine available on this platform
+            logging.warning(f"Dynamic quantization failed, using FP32 CLIP vision model: {e}")
+
+    # Compile the vision tower (the only part run per screenshot) to cut per-op dispatch overhead.
+    # Compilation happens on the warm-up forward so its cost is paid at startup, not mid-session.
+    _eager_vision_model = model.vision_model
+    try:
+        model.vision_model = torch.compile(_eager_vision_model, mode="reduce-overhead", dynamic=False)
+        with torch.inference_mode(), torch.autocast(device_type=DEVICE, dtype=torch.float16, enabled=USE_FP16):
+            model.get_image_features(pixel_values=torch.zeros((1, 3, 224, 224), device=DEVICE))
+        logging.info("CLIP vision model compiled with torch.compile.")
+    except Exception as e:  # torch.compile is unavailable before PyTorch 2.0 or may fail on some platforms
+        model.vision_model = _eager_vision_model
+        logging.warning(f"torch.compile unavailable, using eager CLIP vision model: {e}")
 
 # === ADB UTILITIES === #
-def run_adb_command(cmd: List[str]) -> str:
+def run_adb_command(cmd: List[str], sensitive: bool = False) -> str:
     """
     Executes an ADB command and returns its standard output.
 
     Args:
         cmd: A list of strings representing the ADB command and its arguments.
+        sensitive: Whether the command contains secrets (e.g., a PIN) and must not be logged.
 
     Returns:
         The stripped standard output of the command, or an empty string if an error occurs.
@@ -57,13 +171,149 @@ def run_adb_command(cmd: List[str]) -> str:
         result = subprocess.run(["adb"] + cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
         return result.stdout.strip()
     except subprocess.CalledProcessError as e:
-        logging.error(f"ADB command failed: {' '.join(e.cmd)}, Error: {e.stderr.strip()}")
+        shown_cmd = "<redacted>" if sensitive else ' '.join(e.cmd)
+        logging.error(f"ADB command failed: {shown_cmd}, Error: {e.stderr.strip()}")
         return ""
     except FileNotFoundError:
         messagebox.showerror("Error", "ADB not found. Please ensure ADB is installed and in your system's PATH.")
         logging.error("ADB executable not found. Please ensure ADB is installed and in your system's PATH.")
         return ""
 
+def run_adb_shell(cmd: str, sensitive: bool = False) -> str:
+    """
+    Executes a command in a persistent `adb shell` session and returns its output.
+    Reusing one shell avoids spawning a new adb process and handshake for every input event.
+    Falls back to a one-off `adb shell` invocation if the persistent session cannot be used,
+    and always uses one while the script is not running (at startup, or a session finishing after Stop)
+    so no shell is left open until the next Start.
+
+    Args:
+        cmd: The shell command line to run on the device.
+        sensitive: Whether the command contains secrets (e.g., a PIN) and must not be logged.
+
+    Returns:
+        The stripped output of the command, or an empty string if an error occurs.
+    """
+    global adb_shell_process
+
+    with adb_shell_lock:
+        if running_event.is_set():
+            output = run_in_adb_shell_locked(cmd, "<redacted>" if sensitive else cmd)
+            if output is not None:
+                return output
+        elif adb_shell_process is not None:
+            stop_adb_shell_process(adb_shell_process)
+            adb_shell_process = None
+    return run_adb_command(["shell", cmd], sensitive=sensitive)
+
+def run_in_adb_shell_locked(cmd: str, log_cmd: str) -> Optional[str]:
+    """
+    Runs a command in the persistent ADB shell, starting the shell if needed.
+    The caller must hold adb_shell_lock.
+
+    Args:
+        cmd: The shell command line to run on the device.
+        log_cmd: The form of the command to show in log messages.
+
+    Returns:
+        The stripped output of the command, an empty string if it timed out,
+        or None if the caller should fall back to a one-off command.
+    """
+    global adb_shell_process, adb_shell_output
+
+    try:
+        if adb_shell_process is None or adb_shell_process.poll() is not None:
+            adb_shell_process = subprocess.Popen(["adb", "shell"], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                                 stderr=subprocess.STDOUT, text=True, bufsize=1)
+            adb_shell_output = queue.Queue()
+            threading.Thread(target=read_adb_shell_output, args=(adb_shell_process, adb_shell_output),
+                             daemon=True).start()
+        process, output_lines = adb_shell_process, adb_shell_output
+        process.stdin.write(f"{cmd}; echo {ADB_SHELL_SENTINEL}\n")
+        process.stdin.flush()
+        output: List[str] = []
+        deadline = time.time() + ADB_SHELL_TIMEOUT
+        while True:
+            line = output_lines.get(timeout=max(0.0, deadline - time.time()))
+            if line is None:
+                # The shell exited before finishing the command (e.g., device disconnected)
+                logging.warning(f"Persistent ADB shell closed while running: {log_cmd}")
+                break
+            if line.strip() == ADB_SHELL_SENTINEL:
+                return "".join(output).strip()
+            output.append(line)
+    except queue.Empty:
+        # The shell hung (e.g., ADB over Wi-Fi dropped); don't retry a command that may still run
+        logging.error(f"Persistent ADB shell timed out after {ADB_SHELL_TIMEOUT}s running: {log_cmd}")
+        stop_adb_shell_process(adb_shell_process)
+        adb_shell_process = None
+        return ""
+    except (OSError, ValueError) as e:
+        logging.warning(f"Persistent ADB shell unavailable ({e}), falling back to a one-off command.")
+    if adb_shell_process is not None:
+        stop_adb_shell_process(adb_shell_process)
+        adb_shell_process = None
+    return None
+
+def read_adb_shell_output(process: subprocess.Popen, output_lines: "queue.Queue[Optional[str]]") -> None:
+    """
+    Forwards lines from a persistent ADB shell's stdout to a queue so they can be read with a timeout.
+    Puts None once the shell's output ends, then closes the pipe.
+
+    Args:
+        process: The `adb shell` process to read from.
+        output_lines: The queue that receives each output line.
+    """
+    try:
+        for line in process.stdout:
+            output_lines.put(line)
+    except (OSError, ValueError):
+        pass
+    finally:
+        output_lines.put(None)
+        try:
+            process.stdout.close()
+        except OSError:
+            pass
+
+def stop_adb_shell_process(process: subprocess.Popen) -> None:
+    """
+    Terminates an `adb shell` process and reaps it, killing it if it does not exit promptly.
+    Its stdout pipe is closed by the reader thread once the process has exited.
+
+    Args:
+        process: The `adb shell` process to stop.
+    """
+    try:
+        if process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait(timeout=1)
+        process.stdin.close()
+    except (OSError, ValueError, subprocess.TimeoutExpired) as e:
+        logging.warning(f"Error while stopping persistent ADB shell: {e}")
+
+def close_adb_shell() -> None:
+    """
+    Terminates the persistent ADB shell session if it is running.
+    The process is stopped before taking adb_shell_lock, which unblocks any thread waiting on its output,
+    so this never blocks indefinitely on device I/O (it is called from the GUI thread).
+    """
+    global adb_shell_process
+
+    process = adb_shell_process
+    if process is not None:
+        stop_adb_shell_process(process)
+    if adb_shell_lock.acquire(timeout=2):
+        try:
+            if adb_shell_process is process:
+                adb_shell_process = None
+        finally:
+            adb_shell_lock.release()
+
 def get_screen_size() -> Tuple[int, int]:
     """
     Detects the connected Android device's screen size using ADB.
@@ -72,7 +322,7 @@ def get_screen_size() -> Tuple[int, int]:
         A tuple containing the screen width and height (e.g., (1080, 1920)).
         Defaults to (1080, 1920) if detection fails.
     """
-    output = run_adb_command(["shell", "wm", "size"])
+    output = run_adb_shell("wm size")
     if "Physical size:" in output:
         size_str = output.split("Physical size:")[-1].strip()
         try:
@@ -88,30 +338,33 @@ def get_screen_size() -> Tuple[int, int]:
 # Determine screen dimensions once at startup
 SCREEN_WIDTH, SCREEN_HEIGHT = get_screen_size()
 
-def keep_adb_alive() -> None:
-    """
-    Periodically runs a simple ADB command to maintain the ADB server connection.
-    This prevents the connection from timing out during long periods of inactivity.
-    """
-    while running_event.is_set():
-        run_adb_command(["devices"])  # A lightweight command to keep the connection active
-        time.sleep(30)  # Check every 30 seconds
+# Click region used by perform_clicks: center, bounds, and Cauchy scale
+CLICK_X_CENTER, CLICK_Y_CENTER = int(SCREEN_WIDTH * 0.3), int(SCREEN_HEIGHT * 0.3)
+CLICK_X_MIN, CLICK_X_MAX = int(SCREEN_WIDTH * 0.15), int(SCREEN_WIDTH * 0.5)
+CLICK_Y_MIN, CLICK_Y_MAX = int(SCREEN_HEIGHT * 0.15), int(SCREEN_HEIGHT * 0.5)
+CLICK_X_SCALE, CLICK_Y_SCALE = SCREEN_WIDTH * 0.01, SCREEN_HEIGHT * 0.01
+
+# Swipe region used by do_scroll: start/end centers, bounds, and Cauchy scale
+SCROLL_X_CENTER = int(SCREEN_WIDTH * 0.5)
+SCROLL_Y_START_CENTER, SCROLL_Y_END_CENTER = int(SCREEN_HEIGHT * 0.85), int(SCREEN_HEIGHT * 0.4)
+SCROLL_X_MIN, SCROLL_X_MAX = int(SCREEN_WIDTH * 0.3), int(SCREEN_WIDTH * 0.7)
+SCROLL_Y_MIN, SCROLL_Y_MAX = int(SCREEN_HEIGHT * 0.3), int(SCREEN_HEIGHT * 0.95)
+SCROLL_X_SCALE, SCROLL_Y_SCALE = SCREEN_WIDTH * 0.02, SCREEN_HEIGHT * 0.05
 
 # === DEVICE CONTROL FUNCTIONS === #
 def turn_on_screen() -> None:
     """Turns on the Android device's screen and attempts a swipe-to-unlock."""
     logging.info("Turning on screen...")
-    run_adb_command(["shell", "input", "keyevent", "26"])  # KEYCODE_POWER to wake up
-    time.sleep(1)
-    # Attempt a swipe up to dismiss simple lock screens (e.g., no PIN/pattern)
-    run_adb_command(["shell", "input", "keyevent", "82"])  # KEYCODE_MENU (often acts as unlock)
+    # KEYCODE_POWER to wake up, then KEYCODE_MENU (often acts as unlock) to dismiss simple lock screens.
+    # Sent as one shell command; the on-device sleep gives the screen time to wake before the menu key.
+    run_adb_shell("input keyevent 26 && sleep 1 && input keyevent 82")
     time.sleep(1)
 
 def swipe_to_unlock() -> None:
     """Performs a generic swipe gesture to unlock the device."""
     logging.info("Performing swipe to unlock...")
     # Swipe from bottom-middle to top-middle
-    run_adb_command(["shell", "input", "swipe", "300", "1000", "300", "500", "100"])
+    run_adb_shell("input swipe 300 1000 300 500 100")
     time.sleep(1)
 
 def enter_pin(pin: str) -> None:
@@ -122,15 +375,14 @@ def enter_pin(pin: str) -> None:
         pin: The PIN code as a string.
     """
     logging.info("Entering PIN...")
-    run_adb_command(["shell", "input", "text", pin])
-    time.sleep(0.5)
-    run_adb_command(["shell", "input", "keyevent", "66"])  # KEYCODE_ENTER
+    # Type the PIN and confirm with KEYCODE_ENTER in a single shell command
+    run_adb_shell(f"input text {shlex.quote(pin)} && input keyevent 66", sensitive=True)
     time.sleep(0.5)
 
 def turn_off_screen() -> None:
     """Turns off the Android device's screen."""
     logging.info("Turning off screen...")
-    run_adb_command(["shell", "input", "keyevent", "26"])  # KEYCODE_POWER to turn off
+    run_adb_shell("input keyevent 26")  # KEYCODE_POWER to turn off
 
 def unlock_device(pin_code: str, unlock_method: str) -> None:
     """
@@ -163,7 +415,8 @@ def delayed_screen_off(delay: int = 5) -> None:
 # === LABEL TRACKING AND PERSISTENCE === #
 def load_label_counts() -> Dict[str, int]:
     """
-    Loads label detection counts from the CSV file.
+    Loads label detection counts from the JSON file.
+    If the JSON file does not exist yet, counts from the legacy CSV file are imported and saved as JSON.
 
     Returns:
         A dictionary where keys are labels and values are their counts.
@@ -171,30 +424,59 @@ def load_label_counts() -> Dict[str, int]:
     label_counts: Dict[str, int] = {}
     if os.path.exists(LABEL_COUNT_FILE):
         try:
-            with open(LABEL_COUNT_FILE, mode='r', newline='', encoding='utf-8') as file:
-                reader = csv.reader(file)
-                for row in reader:
-                    if len(row) == 2:
-                        try:
-                            label_counts[row[0]] = int(row[1])
-                        except ValueError:
-                            logging.warning(f"Skipping malformed row in {LABEL_COUNT_FILE}: {row}")
-        except IOError as e:
+            with open(LABEL_COUNT_FILE, mode='r', encoding='utf-8') as file:
+                data = json.load(file)
+            if isinstance(data, dict):
+                for label, count in data.items():
+                    if isinstance(count, int) and not isinstance(count, bool):
+                        label_counts[label] = count
+                    else:
+                        logging.warning(f"Skipping malformed entry in {LABEL_COUNT_FILE}: {label!r}: {count!r}")
+            else:
+                logging.warning(f"Ignoring malformed label counts in {LABEL_COUNT_FILE}")
+        except (IOError, ValueError) as e:
             logging.error(f"Error loading label counts from {LABEL_COUNT_FILE}: {e}")
+    elif os.path.exists(LEGACY_LABEL_COUNT_FILE):
+        label_counts = load_legacy_label_counts()
+        if label_counts:
+            logging.info(f"Imported label counts from {LEGACY_LABEL_COUNT_FILE} into {LABEL_COUNT_FILE}")
+            save_label_counts(label_counts)
+    return label_counts
+
+def load_legacy_label_counts() -> Dict[str, int]:
+    """
+    Loads label detection counts from the legacy CSV file.
+
+    Returns:
+        A dictionary where keys are labels and values are their counts.
+    """
+    label_counts: Dict[str, int] = {}
+    try:
+        with open(LEGACY_LABEL_COUNT_FILE, mode='r', newline='', encoding='utf-8') as file:
+            reader = csv.reader(file)
+            for row in reader:
+                if len(row) == 2:
+                    try:
+                        label_counts[row[0]] = int(row[1])
+                    except ValueError:
+                        logging.warning(f"Skipping malformed row in {LEGACY_LABEL_COUNT_FILE}: {row}")
+    except IOError as e:
+        logging.error(f"Error loading label counts from {LEGACY_LABEL_COUNT_FILE}: {e}")
     return label_counts
 
 def save_label_counts(label_counts: Dict[str, int]) -> None:
     """
-    Saves label detection counts to the CSV file.
+    Saves label detection counts to the JSON file.
+    The file is written to a temporary path and atomically renamed to avoid partial writes.
 
     Args:
         label_counts: A dictionary of labels and their counts.
     """
+    tmp_file = LABEL_COUNT_FILE + ".tmp"
     try:
-        with open(LABEL_COUNT_FILE, mode='w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            for label, count in label_counts.items():
-                writer.writerow([label, count])
+        with open(tmp_file, mode='w', encoding='utf-8') as file:
+            json.dump(label_counts, file)
+        os.replace(tmp_file, LABEL_COUNT_FILE)
     except IOError as e:
         logging.error(f"Error saving label counts to {LABEL_COUNT_FILE}: {e}")
 
@@ -210,6 +492,15 @@ LABELS: List[str] = [
     "off-road racing", "rally", "superbike", "rider", "helmet", "adventure sports"
 ]
 
+# Encode the fixed label list once; only the image needs to go through CLIP per screenshot
+with torch.inference_mode():
+    _text_inputs = processor(text=LABELS, return_tensors="pt", padding=True).to(DEVICE)
+    _text_features = model.get_text_features(**_text_inputs)
+    _text_features = _text_features / _text_features.norm(dim=-1, keepdim=True)
+# The per-frame similarity is a single 1x59 product, so keep it in numpy rather than dispatching through torch
+TEXT_FEATURES: np.ndarray = _text_features.float().cpu().numpy()
+LOGIT_SCALE: float = float(model.logit_scale.exp().item())
+
 def bounded_cauchy(center: float, scale: float, min_val: int, max_val: int) -> int:
     """
     Generates an integer value from a bounded Cauchy distribution.
@@ -224,43 +515,205 @@ def bounded_cauchy(center: float, scale: float, min_val: int, max_val: int) -> i
     Returns:
         A randomly generated integer within the specified bounds.
     """
-    for _ in range(100):  # Attempt up to 100 times to find a value within bounds
-        val = int(center + scale * np.random.standard_cauchy())
-        if min_val <= val <= max_val:
-            return val
+    # Draw a batch of candidates in one numpy call and keep the first one within bounds
+    samples = center + scale * np.random.standard_cauchy(100)
+    valid = samples[(samples >= min_val) & (samples <= max_val)]
+    if valid.size:
+        return int(valid[0])
     # Fallback to a clamped center value if no valid random value is found
     return max(min(int(center), max_val), min_val)
 
-def classify_and_click(window: gw.Window, label_counts: Dict[str, int]) -> bool:
+def prescale_image(image: Image.Image) -> Image.Image:
     """
-    Captures a screenshot of the Scrcpy window, classifies its content using CLIP,
-    and performs simulated clicks if a high-confidence label is detected.
+    Downscales an image so its shortest edge is PRESCALE_SHORTEST_EDGE, preserving aspect ratio.
+
+    Args:
+        image: The PIL image to downscale.
+
+    Returns:
+        The downscaled image, or the original if it is already small enough.
+    """
+    scale = PRESCALE_SHORTEST_EDGE / min(image.size)
+    if scale >= 1:
+        return image
+    new_size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(new_size, Image.BILINEAR)
+
+def preprocess_image(image: Image.Image) -> torch.Tensor:
+    """
+    Resizes, crops, and normalizes an RGB image into the shared PIXEL_BUFFER.
+    The returned tensor is overwritten by the next call.
+
+    Args:
+        image: The RGB PIL image to preprocess.
+
+    Returns:
+        PIXEL_BUFFER, a (1, 3, 224, 224) tensor of CLIP-normalized pixel values.
+    """
+    np.copyto(PIXEL_BYTES, np.asarray(image_resize_crop(image)))
+    pixels = PIXEL_BUFFER[0]
+    pixels.copy_(torch.from_numpy(PIXEL_BYTES).permute(2, 0, 1))
+    pixels.div_(255).sub_(PIXEL_MEAN).div_(PIXEL_STD)
+    return PIXEL_BUFFER
+
+def get_image_features(pixel_values: torch.Tensor) -> np.ndarray:
+    """
+    Encodes preprocessed pixel values into a CLIP image embedding.
+
+    Args:
+        pixel_values: A (1, 3, 224, 224) tensor produced by preprocess_image.
+
+    Returns:
+        The (unnormalized) FP32 image embedding as a 1-D numpy array.
+    """
+    if vision_session is not None:
+        return vision_session.run(None, {"pixel_values": pixel_values.numpy()})[0].reshape(-1)
+    pixel_values = pixel_values.to(DEVICE, non_blocking=True)
+    with torch.inference_mode(), torch.autocast(device_type=DEVICE, dtype=torch.float16, enabled=USE_FP16):
+        return model.get_image_features(pixel_values=pixel_values).float().cpu().numpy().reshape(-1)
+
+def get_window_region(window: gw.Window) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Reads the on-screen region of a window.
+
+    Args:
+        window: The pygetwindow object to read.
+
+    Returns:
+        A (left, top, width, height) tuple, or None if the window has a degenerate size or can't be read
+        (e.g., it was closed).
+    """
+    try:
+        region = (window.left, window.top, window.width, window.height)
+    except Exception as e:
+        logging.error(f"Error reading the Scrcpy window region: {e}")
+        return None
+    return region if region[2] > 0 and region[3] > 0 else None
+
+def capture_window_image(sct: "mss.base.MSSBase", region: Tuple[int, int, int, int]) -> Optional[Image.Image]:
+    """
+    Captures a screenshot of the Scrcpy window as a prescaled RGB image ready for preprocess_image.
+
+    Args:
+        sct: The mss screen grabber owned by the calling thread.
+        region: The (left, top, width, height) screen region of the Scrcpy window.
+
+    Returns:
+        The captured image, or None if the screenshot failed.
+    """
+    try:
+        # Capture the Scrcpy window region with the platform's native screen-copy API
+        left, top, width, height = region
+        raw = sct.grab({"left": left, "top": top, "width": width, "height": height})
+        # Wrap the raw BGRA pixels as an RGB image without an intermediate per-pixel conversion
+        screenshot = Image.frombuffer("RGB", raw.size, raw.bgra, "raw", "BGRX")
+        if DEBUG_SAVE_SCREENSHOTS:
+            screenshot.save(DEBUG_SCREENSHOT_PATH)
+
+        # Use the in-memory screenshot directly instead of a PNG round-trip through disk,
+        # downscaled with a cheap bilinear filter so the bicubic resize works on a small image
+        return prescale_image(screenshot)
+    except Exception as e:
+        logging.error(f"Error capturing Scrcpy window screenshot: {e}")
+        return None
+
+def capture_worker(window: gw.Window, capture_requests: "queue.Queue[int]",
+                   frames: "queue.Queue[Tuple[int, Optional[Image.Image]]]", session_done: threading.Event) -> None:
+    """
+    Captures Scrcpy window screenshots on request for a running session.
+    Running capture in its own thread lets it overlap with the session's scroll and pause,
+    and keeps the thread-local mss screen grabber confined to a single thread.
+    The window region is read once and only re-queried if a capture fails.
 
     Args:
         window: The pygetwindow object representing the Scrcpy window.
+        capture_requests: Queue of sequence numbers of the frames the session wants captured.
+        frames: Queue (maxsize 1) that receives each (sequence number, image) pair.
+        session_done: Event set by the session when it ends.
+    """
+    region = get_window_region(window)
+    with mss.mss() as sct:
+        while not session_done.is_set():
+            try:
+                seq = capture_requests.get(timeout=1)
+            except queue.Empty:
+                continue
+            # Only the most recent request matters; skip any that piled up while capturing
+            while True:
+                try:
+                    seq = capture_requests.get_nowait()
+                except queue.Empty:
+                    break
+            image = capture_window_image(sct, region) if region else None
+            if image is None:
+                # The window may have moved, been resized, or been recreated; look it up again without stealing focus.
+                # Never fall back to the old handle: reading a closed window's rect raises.
+                try:
+                    window = get_scrcpy_window(focus=False)
+                except Exception as e:
+                    logging.error(f"Error looking up the Scrcpy window: {e}")
+                    window = None
+                region = get_window_region(window) if window else None
+                image = capture_window_image(sct, region) if region else None
+            # Replace any unconsumed (stale) frame so this thread never blocks on a full queue
+            try:
+                frames.get_nowait()
+            except queue.Empty:
+                pass
+            frames.put_nowait((seq, image))
+
+def wait_for_frame(frames: "queue.Queue[Tuple[int, Optional[Image.Image]]]", seq: int,
+                   timeout: float) -> Optional[Image.Image]:
+    """
+    Waits for the capture worker to deliver the frame with the given sequence number.
+    Frames from earlier requests (e.g., ones that arrived after a timeout) are discarded,
+    so a classified frame always shows the item after the latest scroll.
+
+    Args:
+        frames: The capture worker's output queue.
+        seq: The sequence number of the requested frame.
+        timeout: The maximum number of seconds to wait.
+
+    Returns:
+        The captured image, or None if it failed or did not arrive in time.
+    """
+    deadline = time.time() + timeout
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return None
+        try:
+            frame_seq, image = frames.get(timeout=remaining)
+        except queue.Empty:
+            return None
+        if frame_seq == seq:
+            return image
+
+def classify_and_click(image: Image.Image, label_counts: Dict[str, int]) -> bool:
+    """
+    Classifies a captured Scrcpy window image using CLIP,
+    and performs simulated clicks if a high-confidence label is detected.
+
+    Args:
+        image: The prescaled RGB screenshot returned by capture_window_image.
         label_counts: A dictionary to update with detected label counts.
 
     Returns:
         True if a high-confidence label was detected and clicks were performed, False otherwise.
     """
     try:
-        # Capture screenshot of the Scrcpy window region
-        screenshot = pyautogui.screenshot(region=(window.left, window.top, window.width, window.height))
-        screenshot_path = "scrcpy_window_screenshot.png"
-        screenshot.save(screenshot_path)
-
-        image = Image.open(screenshot_path)
-        # Prepare inputs for the CLIP model (text labels and image)
-        inputs = processor(text=LABELS, images=image, return_tensors="pt", padding=True)
-        # Get model outputs (logits)
-        outputs = model(**inputs)
-        # Apply softmax to get probabilities
-        probs = outputs.logits_per_image.softmax(dim=1)
-        
-        # Get the index of the label with the highest probability
-        top_index = torch.argmax(probs)
+        # Preprocess the image only; label embeddings are precomputed in TEXT_FEATURES
+        pixel_values = preprocess_image(image)
+        # Encode the image and normalize it for cosine similarity
+        image_features = get_image_features(pixel_values)
+        image_features /= np.linalg.norm(image_features)
+        # Scale similarities like CLIP's logits_per_image
+        logits = LOGIT_SCALE * (TEXT_FEATURES @ image_features)
+
+        # Get the index of the label with the highest probability; only its softmax probability is needed
+        top_index = int(logits.argmax())
         label = LABELS[top_index]
-        confidence = probs[0][top_index].item()
+        confidence = float(1.0 / np.exp(logits - logits[top_index]).sum())
 
         # If confidence is above a threshold, log and perform clicks
         if confidence > 0.51:  # Threshold can be adjusted
@@ -278,14 +731,9 @@ def perform_clicks() -> None:
     Performs simulated mouse clicks within a defined region of the screen.
     Click coordinates are randomized using a bounded Cauchy distribution for natural variation.
     """
-    # Define a central region for clicks
-    x_center, y_center = int(SCREEN_WIDTH * 0.3), int(SCREEN_HEIGHT * 0.3)
-    x_min, x_max = int(SCREEN_WIDTH * 0.15), int(SCREEN_WIDTH * 0.5)
-    y_min, y_max = int(SCREEN_HEIGHT * 0.15), int(SCREEN_HEIGHT * 0.5)
-
-    # Generate random click coordinates within bounds
-    x = bounded_cauchy(x_center, SCREEN_WIDTH * 0.01, x_min, x_max)
-    y = bounded_cauchy(y_center, SCREEN_HEIGHT * 0.01, y_min, y_max)
+    # Generate random click coordinates within the precomputed central click region
+    x = bounded_cauchy(CLICK_X_CENTER, CLICK_X_SCALE, CLICK_X_MIN, CLICK_X_MAX)
+    y = bounded_cauchy(CLICK_Y_CENTER, CLICK_Y_SCALE, CLICK_Y_MIN, CLICK_Y_MAX)
 
     pyautogui.moveTo(x, y)
     time.sleep(0.3)
@@ -299,27 +747,31 @@ def do_scroll() -> None:
     Scroll parameters are randomized for natural interaction.
     """
     time.sleep(0.5)
-    # Define scroll start and end points
-    x_center = int(SCREEN_WIDTH * 0.5)
-    y_start_center = int(SCREEN_HEIGHT * 0.85)
-    y_end_center = int(SCREEN_HEIGHT * 0.4)
-
-    # Define bounds for randomizing scroll coordinates
-    x_min, x_max = int(SCREEN_WIDTH * 0.3), int(SCREEN_WIDTH * 0.7)
-    y_min, y_max = int(SCREEN_HEIGHT * 0.3), int(SCREEN_HEIGHT * 0.95)
-
-    # Generate random start and end coordinates for the swipe
-    x1 = bounded_cauchy(x_center, SCREEN_WIDTH * 0.02, x_min, x_max)
-    x2 = bounded_cauchy(x_center, SCREEN_WIDTH * 0.02, x_min, x_max)
-    y1 = bounded_cauchy(y_start_center, SCREEN_HEIGHT * 0.05, y_min, y_max)
-    y2 = bounded_cauchy(y_end_center, SCREEN_HEIGHT * 0.05, y_min, y_max)
+    # Generate random start and end coordinates for the swipe within the precomputed scroll region
+    x1 = bounded_cauchy(SCROLL_X_CENTER, SCROLL_X_SCALE, SCROLL_X_MIN, SCROLL_X_MAX)
+    x2 = bounded_cauchy(SCROLL_X_CENTER, SCROLL_X_SCALE, SCROLL_X_MIN, SCROLL_X_MAX)
+    y1 = bounded_cauchy(SCROLL_Y_START_CENTER, SCROLL_Y_SCALE, SCROLL_Y_MIN, SCROLL_Y_MAX)
+    y2 = bounded_cauchy(SCROLL_Y_END_CENTER, SCROLL_Y_SCALE, SCROLL_Y_MIN, SCROLL_Y_MAX)
 
     # Ensure scroll is generally downwards; adjust if y1 ends up higher than y2
     if y1 < y2:
-        y2 = bounded_cauchy(y_end_center, SCREEN_HEIGHT * 0.05, y_min, y_max)
+        y2 = bounded_cauchy(SCROLL_Y_END_CENTER, SCROLL_Y_SCALE, SCROLL_Y_MIN, SCROLL_Y_MAX)
 
     duration = random.randint(100, 200)  # Duration of the swipe in milliseconds
-    run_adb_command(["shell", "input", "swipe", str(x1), str(y1), str(x2), str(y2), str(duration)])
+    run_adb_shell(f"input swipe {x1} {y1} {x2} {y2} {duration}")
+
+def scroll_then_request_capture(capture_requests: "queue.Queue[int]", seq: int) -> None:
+    """
+    Scrolls to the next item, then asks the capture worker for a screenshot of it
+    once the scroll animation has had time to settle.
+
+    Args:
+        capture_requests: The capture worker's request queue.
+        seq: The sequence number to tag the requested frame with.
+    """
+    do_scroll()
+    time.sleep(SCROLL_SETTLE_SECONDS)  # Avoid classifying (and liking) a frame taken mid-transition
+    capture_requests.put(seq)
 
 # === MAIN INTERACTION RUNNER === #
 def run_session(duration_min: int, pin_code: str, unlock_method: str) -> None:
@@ -342,20 +794,54 @@ def run_session(duration_min: int, pin_code: str, unlock_method: str) -> None:
 
     unlock_device(pin_code, unlock_method)  # Unlock at the start of each session
 
+    # Track unsaved count changes so the file is only rewritten when something changed
+    counts_dirty = False
+    loops_since_save = 0
+
+    # Capture runs in a worker thread so the next frame is grabbed while the session pauses
+    # Frames are tagged with a sequence number so late frames from timed-out requests can be dropped
+    capture_requests: "queue.Queue[int]" = queue.Queue()
+    frames: "queue.Queue[Tuple[int, Optional[Image.Image]]]" = queue.Queue(maxsize=1)
+    session_done = threading.Event()
+    threading.Thread(target=capture_worker, args=(window, capture_requests, frames, session_done), daemon=True).start()
+    frame_seq = 0
+    capture_requests.put(frame_seq)  # Capture the first frame right away
+
     # Main loop for the session
     while time.time() < end_time and running_event.is_set():
-        found = classify_and_click(window, label_counts)
-        do_scroll()
-        save_label_counts(label_counts)
+        image = wait_for_frame(frames, frame_seq, timeout=30)
+        if image is None:
+            logging.warning("No Scrcpy window screenshot available; skipping classification.")
+        # Counts only change when a label is found
+        found = classify_and_click(image, label_counts) if image is not None else False
+        counts_dirty = counts_dirty or found
+        loops_since_save += 1
+        if counts_dirty and loops_since_save >= LABEL_SAVE_INTERVAL:
+            save_label_counts(label_counts)
+            counts_dirty = False
+            loops_since_save = 0
+        # Scroll and capture the next frame in the background while pausing; clicks only happen
+        # after the next frame has been received, so they never overlap a capture
+        frame_seq += 1
+        scroll_thread = threading.Thread(target=scroll_then_request_capture, args=(capture_requests, frame_seq), daemon=True)
+        scroll_thread.start()
         # Adjust sleep time based on whether a relevant label was found
-        time.sleep(random.randint(2, 17) if found else random.randint(1, 5))
+        interruptible_sleep(random.randint(2, 17) if found else random.randint(1, 5))
+        scroll_thread.join()
 
+    session_done.set()  # The capture worker exits within a second and releases its mss handle
+    if counts_dirty:
+        save_label_counts(label_counts)  # Flush any remaining changes at the end of the session
     turn_off_screen()
 
-def get_scrcpy_window() -> Optional[gw.Window]:
+def get_scrcpy_window(focus: bool = True) -> Optional[gw.Window]:
     """
     Attempts to find and return the Scrcpy window object.
 
+    Args:
+        focus: Whether to bring the window to the foreground. Disable for re-queries during a session
+            so the window does not steal focus.
+
     Returns:
         A pygetwindow.Window object if found, otherwise None.
     """
@@ -363,11 +849,27 @@ def get_scrcpy_window() -> Optional[gw.Window]:
     if windows:
         window = windows[0]
         window.restore()  # Ensure the window is visible
-        window.activate() # Bring it to the foreground
+        if focus:
+            window.activate() # Bring it to the foreground
         return window
     return None
 
 # === TIME UTILITIES FOR SCHEDULING === #
+def interruptible_sleep(total_seconds: float) -> None:
+    """
+    Sleeps for up to the given duration, returning early (within a second) once running_event is cleared.
+    This keeps long waits from delaying a stop request.
+
+    Args:
+        total_seconds: The maximum number of seconds to sleep.
+    """
+    end = time.time() + total_seconds
+    while running_event.is_set():
+        remaining = end - time.time()
+        if remaining <= 0:
+            break
+        time.sleep(min(1.0, remaining))
+
 def generate_random_time(start: str, end: str) -> str:
     """
     Generates a random time string (HH:MM) between a specified start and end time.
@@ -414,29 +916,34 @@ def generate_school_times(code: str) -> Optional[List[str]]:
         logging.error(f"Invalid school code provided: {code}")
         return None
 
-def is_within_time(current: str, target: str, tolerance_minutes: int = 5) -> bool:
+def time_to_minutes(hhmm: str) -> int:
+    """
+    Converts a time string to minutes since midnight.
+
+    Args:
+        hhmm: The time in "HH:MM" format.
+
+    Returns:
+        The number of minutes since midnight (0-1439).
+    """
+    hours, minutes = hhmm.split(":")
+    return int(hours) * 60 + int(minutes)
+
+def is_within_time(current: int, target: int, tolerance_minutes: int = 5) -> bool:
     """
     Checks if the current time is within a specified tolerance of a target time.
 
     Args:
-        current: The current time in "HH:MM" format.
-        target: The target time in "HH:MM" format.
+        current: The current time in minutes since midnight.
+        target: The target time in minutes since midnight.
         tolerance_minutes: The number of minutes tolerance around the target time.
 
     Returns:
         True if the current time is within the tolerance of the target time, False otherwise.
     """
-    fmt = "%H:%M"
-    current_dt = datetime.strptime(current, fmt)
-    target_dt = datetime.strptime(target, fmt)
-    
-    # Handle target times spanning midnight for accurate comparison
-    if target_dt < current_dt - timedelta(hours=12): # Target is probably next day
-        target_dt += timedelta(days=1)
-    elif target_dt > current_dt + timedelta(hours=12): # Target is probably previous day
-        target_dt -= timedelta(days=1)
-
-    return abs(current_dt - target_dt) <= timedelta(minutes=tolerance_minutes)
+    # Measure the distance around the 24-hour clock so targets spanning midnight compare correctly
+    diff = (current - target) % 1440
+    return min(diff, 1440 - diff) <= tolerance_minutes
 
 # === MAIN SCHEDULER LOOP === #
 def scheduler_loop(school_type: str, pin_code: str, unlock_method: str) -> None:
@@ -456,21 +963,28 @@ def scheduler_loop(school_type: str, pin_code: str, unlock_method: str) -> None:
 
     start_time, end_time, bedtime = times
     logging.info(f"Scheduler initialized with times → Start: {start_time}, End: {end_time}, Bed: {bedtime}")
+    # Target times as minutes since midnight, recomputed only when the times are regenerated
+    target_minutes = [time_to_minutes(t) for t in times]
     last_activation: Optional[datetime] = None
 
     while running_event.is_set():
-        now = datetime.now().strftime("%H:%M")
+        current = datetime.now()
+        now = current.strftime("%H:%M")
+        now_minutes = current.hour * 60 + current.minute
 
         # Regenerate daily interaction times shortly after midnight
-        if "00:30" <= now <= "00:40":
+        if 30 <= now_minutes <= 40:
             new_times = generate_school_times(school_type)
             if new_times:
                 start_time, end_time, bedtime = new_times
+                target_minutes = [time_to_minutes(t) for t in new_times]
                 logging.info(f"Daily times regenerated → Start: {start_time}, End: {end_time}, Bed: {bedtime}")
-            time.sleep(60 * 10)  # Sleep for 10 minutes to avoid immediate re-generation
+            interruptible_sleep(60 * 10)  # Sleep for 10 minutes to avoid immediate re-generation
+            if not running_event.is_set():
+                break  # Stopped during the wait; don't trigger a session
 
         # Check if current time is near any of the scheduled interaction points
-        if any(is_within_time(now, t) for t in [start_time, end_time, bedtime]):
+        if any(is_within_time(now_minutes, t) for t in target_minutes):
             # Prevent rapid re-activation within a short period (e.g., 15 minutes)
             if not last_activation or (datetime.now() - last_activation) > timedelta(minutes=15):
                 logging.info(f"Scheduled session triggered at {now}")
@@ -486,13 +1000,12 @@ def scheduler_loop(school_type: str, pin_code: str, unlock_method: str) -> None:
                 # Start the interaction session in a new thread to keep the scheduler responsive
                 threading.Thread(target=run_session, args=(duration, pin_code, unlock_method)).start()
 
-        time.sleep(60)  # Check every minute
+        interruptible_sleep(60)  # Check every minute
 
 # === GUI FUNCTIONS === #
 def start_script() -> None:
     """
-    Initiates the main script execution, launching Scrcpy and starting the scheduler
-    and ADB keep-alive threads.
+    Initiates the main script execution, launching Scrcpy and starting the scheduler thread.
     """
     global scheduler_thread, adb_process
 
@@ -538,15 +1051,11 @@ def start_script() -> None:
         stop_script()
         return
 
-    # Start the scheduler and ADB keep-alive threads
+    # Start the scheduler thread; the persistent ADB shell keeps the device connection warm on its own
     scheduler_thread = threading.Thread(target=scheduler_loop, args=(school_type, pin_code, unlock_method))
     scheduler_thread.daemon = True  # Allows the main program to exit even if this thread is still running
     scheduler_thread.start()
 
-    adb_keep_alive_thread = threading.Thread(target=keep_adb_alive)
-    adb_keep_alive_thread.daemon = True
-    adb_keep_alive_thread.start()
-
     logging.info("Script started successfully. Monitoring for scheduled interactions.")
 
 def stop_script() -> None:
@@ -581,7 +1090,11 @@ def stop_script() -> None:
             logging.warning("Scrcpy process did not terminate gracefully within timeout. Killing it.")
             adb_process.kill() # Force kill if it doesn't terminate
         logging.info("Scrcpy process terminated.")
-    
+
+    # Close the persistent ADB shell; commands issued after Stop (e.g., the ending session's
+    # turn_off_screen) use one-off adb calls, and the next Start opens a new shell on demand
+    close_adb_shell()
+
     logging.info("Script stopped.")
 
 # === GUI SETUP === #